@@ -0,0 +1,685 @@
+import json
+import csv
+import time
+import logging
+import requests
+import hmac
+import hashlib
+import base64
+import os
+import sys
+import cProfile
+import pstats
+import threading
+import functools
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import urlencode
+
+# Налаштування логування
+logging.basicConfig(filename='log.txt', level=logging.DEBUG, 
+                    format='%(asctime)s %(levelname)s: %(message)s')
+
+# Читання конфігураційного файлу
+try:
+    with open('config.json', 'r') as file:
+        config = json.load(file)
+except Exception as e:
+    logging.error(f"Помилка при читанні config.json: {str(e)}")
+    raise
+
+# Читання API ключів
+try:
+    with open('api_keys.json', 'r') as file:
+        api_keys = json.load(file)
+except Exception as e:
+    logging.error(f"Помилка при читанні api_keys.json: {str(e)}")
+    raise
+
+# Читання адрес із файлу CSV
+try:
+    with open('wallets.csv', 'r') as file:
+        reader = csv.reader(file)
+        wallet_addresses = [row[0] for row in reader]
+except Exception as e:
+    logging.error(f"Помилка при читанні wallets.csv: {str(e)}")
+    raise
+
+# Налаштування трасування і профілювання (секція "trace" у config.json):
+#   "enabled": true           - записувати тривалість викликів у файл трасування
+#   "file": "trace.json"      - файл у форматі Chrome Trace (chrome://tracing, ui.perfetto.dev)
+#   "profile_cycles": 3       - профілювати перші N циклів main()
+#   "profile_mode": "cprofile" або "sampling"
+#   "profile_file": "profile.prof" - результат cProfile (для sampling - згорнуті стеки)
+trace_config = config.get('trace', {})
+TRACE_ENABLED = bool(trace_config.get('enabled', False))
+TRACE_FILE = trace_config.get('file', 'trace.json')
+PROFILE_CYCLES = int(trace_config.get('profile_cycles', 0))
+PROFILE_MODE = trace_config.get('profile_mode', 'cprofile')
+PROFILE_FILE = trace_config.get('profile_file', 'profile.prof' if PROFILE_MODE == 'cprofile' else 'profile.folded')
+SAMPLING_INTERVAL = float(trace_config.get('sampling_interval', 0.005))
+
+trace_lock = threading.Lock()
+trace_file = None
+
+# Функція для запису однієї події у файл трасування
+def write_trace_event(name, start_ns, end_ns, args=None):
+    global trace_file
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': start_ns / 1000,
+        'dur': (end_ns - start_ns) / 1000,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+    }
+    if args:
+        event['args'] = args
+    with trace_lock:
+        if trace_file is None:
+            # Формат JSON Array: закриваюча дужка необов'язкова, тому події дописуються по одній
+            trace_file = open(TRACE_FILE, 'w', encoding='utf-8')
+            trace_file.write('[\n')
+        trace_file.write(json.dumps(event, ensure_ascii=False) + ',\n')
+        trace_file.flush()
+
+# Контекстний менеджер для вимірювання тривалості ділянки коду
+@contextmanager
+def trace_span(name, **args):
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        write_trace_event(name, start_ns, time.perf_counter_ns(), args)
+
+# Функція, що повертає span або порожній контекст, якщо трасування вимкнено
+def span(name, **args):
+    if TRACE_ENABLED:
+        return trace_span(name, **args)
+    return nullcontext()
+
+# Декоратор для трасування функцій; без трасування функція повертається без змін
+def traced(name, arg_names=()):
+    def decorator(func):
+        if not TRACE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Записуються лише явно вказані аргументи, щоб у трасування не потрапили ключі
+            span_args = {arg_name: str(value) for arg_name, value in zip(arg_names, args)}
+            with trace_span(name, **span_args):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Функція для створення підпису
+@traced('generate_signature')
+def generate_signature(timestamp, method, request_path, body, secret_key):
+    body_str = json.dumps(body) if body else ''
+    message = timestamp + method + request_path + body_str
+    mac = hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256)
+    return base64.b64encode(mac.digest()).decode('utf-8')
+
+# Функція для виконання підписаного запиту до API OKX
+def okx_request(method, url, params=None, body=''):
+    base_url = 'https://www.okx.com'
+    if params:
+        url = url + '?' + urlencode(params)
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"],
+        'Content-Type': 'application/json'
+    }
+    if method == 'GET':
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+    else:
+        response = requests.post(base_url + url, headers=headers, json=body, timeout=request_timeout())
+    response.raise_for_status()
+    data = response.json()
+    # OKX повертає помилки бізнес-логіки з HTTP 200 і ненульовим code
+    if data.get('code', '0') != '0':
+        raise requests.exceptions.RequestException(f"OKX {data.get('code')}: {data.get('msg')}", response=response)
+    return data
+
+# Функція для перевірки балансу
+@traced('check_balance')
+def check_balance():
+    url = '/api/v5/account/balance'
+    base_url = 'https://www.okx.com'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'GET'
+    body = ''
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"]
+    }
+    try:
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+        response.raise_for_status()
+        balance_data = response.json()
+        return balance_data
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при перевірці балансу: {str(e)}")
+        return None
+
+# Функція для фільтрації та виведення основної інформації про баланс
+def filter_balance_data(balance_data):
+    filtered_data = []
+    for detail in balance_data['data'][0]['details']:
+        if float(detail['eqUsd']) > 1:
+            filtered_data.append({
+                'Currency': detail['ccy'],
+                'Available Balance': round(float(detail['availBal']), 2),
+                'Equivalent in USD': round(float(detail['eqUsd']), 2)
+            })
+    return filtered_data
+
+# Функція для перевірки комісії
+@traced('check_fee', arg_names=('currency', 'chain'))
+def check_fee(currency, chain):
+    url = f'/api/v5/asset/currencies/{currency}'
+    base_url = 'https://www.okx.com'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'GET'
+    body = ''
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"]
+    }
+    try:
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+        response.raise_for_status()
+        fee_data = response.json()
+        for item in fee_data['data']:
+            if item['ccy'] == currency and item['chain'] == chain:
+                # Без округлення: комісії на кшталт 0.0001 не повинні перетворюватися на 0
+                return float(item['withdrawal_min_fee'])
+        logging.error(f"Валюта {currency} у мережі {chain} не знайдена в отриманих даних.")
+        return None
+    except requests.exceptions.RequestException as e:
+        if e.response.status_code == 404:
+            logging.error(f"Помилка при перевірці комісії: Валюта не знайдена (404)")
+        else:
+            logging.error(f"Помилка при перевірці комісії: {str(e)}")
+        return None
+
+# Функція для виведення коштів
+@traced('withdraw', arg_names=('amount', 'address'))
+def withdraw(amount, address):
+    url = '/api/v5/asset/withdrawal'
+    base_url = 'https://www.okx.com'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'POST'
+    body = {
+        'currency': config["currency"],
+        'amount': amount,
+        'destination': '4',  # 4 - адреса гаманця
+        'toAddress': address,
+        'chain': config["chain"],
+        'fee': config["max_fee"],
+        'pwd': api_keys["withdrawal_password"]
+    }
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"],
+        'Content-Type': 'application/json'
+    }
+    try:
+        response = requests.post(base_url + url, headers=headers, json=body, timeout=request_timeout())
+        response.raise_for_status()
+        logging.info(f"Успішне виведення {amount} {config['currency']} на адресу {address}")
+        print(f"Успішне виведення {amount} {config['currency']} на адресу {address}")
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при виведенні: {str(e)}")
+        print(f"Помилка при виведенні: {str(e)}")
+
+# Функція для отримання поточного значення GWEI через API Etherscan
+@traced('get_current_gwei')
+def get_current_gwei():
+    url = f'https://api.etherscan.io/api?module=gastracker&action=gasoracle&apikey={api_keys["etherscan_api_key"]}'
+    try:
+        response = requests.get(url, timeout=request_timeout())
+        response.raise_for_status()
+        data = response.json()
+        if data['status'] == '1':
+            return round(float(data['result']['ProposeGasPrice']), 2)
+        else:
+            logging.error(f"Помилка при запиті до Etherscan: {data['message']}")
+            return None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при запиті до Etherscan: {str(e)}")
+        return None
+
+# Результат перевірки одного шлюзу (gate) перед виведенням
+GateResult = namedtuple('GateResult', ['name', 'passed', 'reason', 'value', 'duration'])
+
+# Зареєстровані шлюзи: назва -> функція(context), що повертає (passed, reason, value)
+GATES = {}
+
+# Декоратор для реєстрації шлюзу; так само додаються і власні шлюзи користувача
+def register_gate(name):
+    def decorator(func):
+        GATES[name] = func
+        return func
+    return decorator
+
+# Шлюз: поточне значення GWEI менше max_gwei
+@register_gate('gwei')
+def gate_gwei(context):
+    gwei = get_current_gwei()
+    if gwei is not None:
+        config_max_gwei = config.get('max_gwei', 5)  # Використовується 5 як значення за замовчуванням, якщо max_gwei відсутній
+
+        if gwei < config_max_gwei:
+            logging.info(f"Поточне значення GWEI ({gwei}) менше {config_max_gwei}, виконання зняття коштів дозволено.")
+            return True, f"GWEI {gwei} < {config_max_gwei}", gwei
+        else:
+            logging.warning(f"Поточне значення GWEI ({gwei}) більше {config_max_gwei}, виведення коштів заборонено.")
+            return False, f"GWEI {gwei} >= {config_max_gwei}", gwei
+    else:
+        logging.error("Не вдалося отримати поточне значення GWEI")
+    return False, "Не вдалося отримати поточне значення GWEI", None
+
+# Шлюз: на funding-рахунку достатньо коштів для всієї партії виведень
+@register_gate('balance')
+def gate_balance(context):
+    balance = check_funding_balance()
+    if not balance:
+        return False, "Не вдалося отримати баланс", None
+    currency = context['currency']
+    required = get_required_amount(context)
+    available = get_available_balance(balance, currency)
+    if available >= required:
+        return True, f"Баланс {available} {currency} >= {required}", balance
+    return False, f"Недостатньо коштів на балансі: {available} {currency} < {required}", balance
+
+# Шлюз: комісія мережі не перевищує max_fee
+@register_gate('fee')
+def gate_fee(context):
+    fee = check_fee(context['currency'], context['chain'])
+    if fee is None:
+        return False, "Не вдалося отримати дані про комісію", None
+    max_fee = float(config["max_fee"])
+    if fee <= max_fee:
+        return True, f"Комісія {fee} <= {max_fee}", fee
+    return False, f"Комісія {fee} перевищує max_fee {max_fee}", fee
+
+# Функція для перевірки балансу funding-рахунку: з нього виконуються виведення
+# і на нього надходять перекази з субакаунтів
+@traced('check_funding_balance')
+def check_funding_balance():
+    try:
+        return okx_request('GET', '/api/v5/asset/balances')
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при перевірці балансу: {str(e)}")
+        return None
+
+# Функція для отримання доступного балансу валюти з відповіді check_funding_balance
+def get_available_balance(balance, currency):
+    return sum((Decimal(item['availBal']) for item in balance['data'] if item['ccy'] == currency), Decimal('0'))
+
+# Функція для розрахунку суми, потрібної для всієї партії виведень, разом з комісією за кожне виведення:
+# запит без маршруту передає fee = max_fee, а мережі маршрутів мають комісію не більшу за max_fee
+def get_required_amount(context):
+    fee = Decimal(str(config["max_fee"]))
+    return (Decimal(str(context['amount'])) + fee) * len(context['selected_addresses'])
+
+# Дедлайн HTTP-запитів поточного потоку: шлюзи, sweep і знімки бірж не лише перестають чекати
+# на результат, а й обмежують тайм-аут кожного запиту залишком свого дедлайну
+request_context = threading.local()
+
+# Функція для обчислення дедлайну, не пізнішого за дедлайн, успадкований поточним потоком
+def make_deadline(timeout):
+    deadline = time.monotonic() + timeout
+    inherited = getattr(request_context, 'deadline', None)
+    return deadline if inherited is None else min(deadline, inherited)
+
+# Функція для виконання func з дедлайном HTTP-запитів у поточному потоці
+def call_with_deadline(deadline, func, *args):
+    previous = getattr(request_context, 'deadline', None)
+    request_context.deadline = deadline
+    try:
+        return func(*args)
+    finally:
+        request_context.deadline = previous
+
+# Тайм-аут HTTP-запиту: залишок дедлайну потоку, але не більше request_timeout з config.json
+def request_timeout():
+    timeout = float(config.get('request_timeout', 30))
+    deadline = getattr(request_context, 'deadline', None)
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+    return max(timeout, 0.1)
+
+# Функція для виконання одного шлюзу з вимірюванням часу
+def run_gate(name, gate, context):
+    start = time.perf_counter()
+    try:
+        with span(f"gate:{name}"):
+            passed, reason, value = gate(context)
+    except Exception as e:
+        logging.error(f"Помилка у шлюзі {name}: {str(e)}")
+        passed, reason, value = False, f"Помилка: {str(e)}", None
+    return GateResult(name, passed, reason, value, time.perf_counter() - start)
+
+# Функція для одночасної перевірки всіх шлюзів зі спільним дедлайном (gate_timeout у config.json)
+def evaluate_gates(context, gates=None):
+    gates = GATES if gates is None else gates
+    timeout = float(config.get('gate_timeout', 10))
+    deadline = make_deadline(timeout)
+    executor = ThreadPoolExecutor(max_workers=len(gates), thread_name_prefix='gate')
+    futures = {executor.submit(call_with_deadline, deadline, run_gate, name, gate, context): name for name, gate in gates.items()}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    # Не чекаємо на шлюзи, що не встигли до дедлайну
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    for future, name in futures.items():
+        if future in done:
+            results[name] = future.result()
+        else:
+            logging.error(f"Шлюз {name} не завершився за {timeout} с")
+            results[name] = GateResult(name, False, f"Перевищено час очікування {timeout} с", None, timeout)
+    passed = all(result.passed for result in results.values())
+    return passed, results
+
+# Функція для отримання списку субакаунтів
+@traced('list_subaccounts')
+def list_subaccounts():
+    data = okx_request('GET', '/api/v5/users/subaccount/list')
+    return [item['subAcct'] for item in data['data']]
+
+# Функція для отримання доступного балансу валюти на funding-рахунку субакаунта
+@traced('get_subaccount_balance', arg_names=('sub_account', 'currency'))
+def get_subaccount_balance(sub_account, currency):
+    data = okx_request('GET', '/api/v5/asset/subaccount/balances', {'subAcct': sub_account, 'ccy': currency})
+    return sum((Decimal(item['availBal']) for item in data['data'] if item['ccy'] == currency), Decimal('0'))
+
+# Функція для внутрішнього переказу з субакаунта на основний funding-рахунок
+@traced('transfer_from_subaccount', arg_names=('sub_account', 'currency', 'amount'))
+def transfer_from_subaccount(sub_account, currency, amount):
+    body = {
+        'ccy': currency,
+        'amt': str(amount),
+        'from': '6',  # 6 - funding-рахунок
+        'to': '6',
+        'type': '2',  # 2 - з субакаунта на основний акаунт
+        'subAcct': sub_account
+    }
+    okx_request('POST', '/api/v5/asset/transfer', body=body)
+    logging.info(f"Переказ {amount} {currency} з субакаунта {sub_account} на основний акаунт")
+    print(f"Переказ {amount} {currency} з субакаунта {sub_account} на основний акаунт")
+
+# Функція для вибору мінімального набору переказів, що покриває нестачу
+def plan_transfers(sub_balances, shortfall):
+    transfers = []
+    # Найбільші баланси першими - так переказів потрібно найменше
+    for sub_account, available in sorted(sub_balances.items(), key=lambda item: item[1], reverse=True):
+        if shortfall <= 0:
+            break
+        if available <= 0:
+            continue
+        amount = min(available, shortfall)
+        transfers.append((sub_account, amount))
+        shortfall -= amount
+    if shortfall > 0:
+        return None
+    return transfers
+
+# Функція для поповнення основного акаунта з субакаунтів перед виведенням
+# (subaccount_sweep і sweep_timeout у config.json)
+def sweep_subaccounts(currency, shortfall):
+    timeout = float(config.get('sweep_timeout', 20))
+    deadline = make_deadline(timeout)
+    try:
+        sub_accounts = call_with_deadline(deadline, list_subaccounts)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при отриманні списку субакаунтів: {str(e)}")
+        return False
+    if not sub_accounts:
+        logging.warning("Субакаунти не знайдено")
+        return False
+
+    # Баланси всіх субакаунтів запитуються одночасно
+    executor = ThreadPoolExecutor(max_workers=min(len(sub_accounts), 16), thread_name_prefix='sweep')
+    futures = {executor.submit(call_with_deadline, deadline, get_subaccount_balance, sub_account, currency): sub_account for sub_account in sub_accounts}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    sub_balances = {}
+    for future, sub_account in futures.items():
+        if future not in done:
+            logging.error(f"Баланс субакаунта {sub_account} не отримано за {timeout} с")
+        elif future.exception() is not None:
+            logging.error(f"Помилка при перевірці балансу субакаунта {sub_account}: {str(future.exception())}")
+        else:
+            sub_balances[sub_account] = future.result()
+
+    transfers = plan_transfers(sub_balances, shortfall)
+    if transfers is None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        logging.warning(f"На субакаунтах недостатньо {currency} для покриття нестачі {shortfall}")
+        return False
+
+    futures = {executor.submit(call_with_deadline, deadline, transfer_from_subaccount, sub_account, currency, amount): sub_account for sub_account, amount in transfers}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    executor.shutdown(wait=False, cancel_futures=True)
+    success = True
+    for future, sub_account in futures.items():
+        if future not in done:
+            logging.error(f"Переказ з субакаунта {sub_account} не завершився за {timeout} с")
+            success = False
+        elif future.exception() is not None:
+            logging.error(f"Помилка при переказі з субакаунта {sub_account}: {str(future.exception())}")
+            success = False
+    return success
+
+# Функція для друку параметрів конфігурації
+def print_config():
+    print(json.dumps(config, indent=4))
+
+# Функція для обробки діапазонів індексів гаманців
+def process_wallet_indexes(indexes):
+    expanded_indexes = []
+    for index in indexes:
+        if isinstance(index, str) and '-' in index:
+            start, end = map(int, index.split('-'))
+            expanded_indexes.extend(range(start, end + 1))
+        else:
+            expanded_indexes.append(int(index))
+    return expanded_indexes
+
+# Клас для вибіркового (sampling) профілювання всіх потоків: шлюзи і виведення працюють у робочих
+# потоках, тому кожен стек починається з назви потоку
+class SamplingProfiler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Запис у форматі згорнутих стеків (flamegraph.pl, speedscope)
+    def dump_stats(self, filename):
+        with open(filename, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+# Клас для профілювання cProfile усіх потоків: кожен потік, створений під час профілювання,
+# отримує власний cProfile.Profile (через threading.setprofile), а результати об'єднуються
+class ThreadProfiler:
+    def __init__(self):
+        self.main_profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+
+    # Перша подія в новому потоці: далі подіями цього потоку керує його власний профайлер
+    def start_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: профайлер основного потоку вже бачить усі потоки
+            return
+        with self.lock:
+            self.thread_profiles.append((threading.current_thread(), profile))
+
+    def enable(self):
+        threading.setprofile(self.start_thread)
+        self.main_profile.enable()
+
+    def disable(self):
+        self.main_profile.disable()
+        threading.setprofile(None)
+
+    def stats(self):
+        stats = pstats.Stats(self.main_profile)
+        with self.lock:
+            # Потоки, що ще працюють (наприклад, шлюз після дедлайну), пропускаються
+            finished = [profile for thread, profile in self.thread_profiles if not thread.is_alive()]
+        for profile in finished:
+            stats.add(profile)
+        return stats
+
+    def dump_stats(self, filename):
+        self.stats().dump_stats(filename)
+
+# Функція для створення профайлера відповідно до profile_mode
+def create_profiler():
+    if PROFILE_MODE == 'sampling':
+        return SamplingProfiler(SAMPLING_INTERVAL)
+    return ThreadProfiler()
+
+# Функція для збереження результатів профілювання
+def save_profile(profiler):
+    profiler.dump_stats(PROFILE_FILE)
+    logging.info(f"Результати профілювання збережено у {PROFILE_FILE}")
+    print(f"Результати профілювання збережено у {PROFILE_FILE}")
+    if isinstance(profiler, ThreadProfiler):
+        profiler.stats().sort_stats('cumulative').print_stats(20)
+
+# Один цикл перевірок і виведення коштів
+def run_cycle():
+    print_config()
+    
+    # Вивід адрес гаманців з файлу wallets.csv за порядковими номерами з config.json
+    selected_addresses = []
+    if "wallet_indexes" in config:
+        print("Адреси гаманців вибрані з wallets.csv:")
+        processed_indexes = process_wallet_indexes(config["wallet_indexes"])
+        for index in processed_indexes:
+            if index <= len(wallet_addresses):
+                address = wallet_addresses[index - 1]
+                selected_addresses.append(address)
+                print(f"{index}: {address}")
+            else:
+                logging.error(f"Індекс {index} перевищує кількість адрес у файлі")
+    else:
+        print("Порядкові номери гаманців не знайдено в конфігурації")
+    
+    # Перевірка GWEI, балансу і комісії виконується одночасно
+    context = {
+        'currency': config["currency"],
+        'chain': config["chain"],
+        'amount': config["amount"],
+        'selected_addresses': selected_addresses,
+    }
+    passed, results = evaluate_gates(context)
+
+    balance = results['balance'].value if 'balance' in results else None
+    if balance:
+        print(f"Доступно на funding-рахунку: {get_available_balance(balance, config['currency'])} {config['currency']}")
+    if 'fee' in results and results['fee'].value is not None:
+        print(f"Комісія на виведення {config['currency']} у мережі {config['chain']}: {results['fee'].value}")
+
+    for result in results.values():
+        status = "OK" if result.passed else "ВІДМОВА"
+        print(f"[{status}] {result.name}: {result.reason} ({result.duration:.3f} с)")
+
+    # Якщо не вистачає лише коштів на основному акаунті - поповнюємо його з субакаунтів
+    failed = [name for name, result in results.items() if not result.passed]
+    if failed == ['balance'] and balance and config.get('subaccount_sweep', False):
+        shortfall = get_required_amount(context) - get_available_balance(balance, context['currency'])
+        print(f"Нестача {shortfall} {context['currency']}, поповнення з субакаунтів")
+        with span('sweep', shortfall=str(shortfall)):
+            passed = sweep_subaccounts(context['currency'], shortfall)
+        if not passed:
+            print("Недостатньо коштів на балансі")
+
+    if passed:
+        for address in selected_addresses:
+            withdraw(config["amount"], address)
+    else:
+        print("Виведення коштів заборонено: " + "; ".join(result.reason for result in results.values() if not result.passed))
+
+# Основна логіка
+def main():
+    profiler = create_profiler() if PROFILE_CYCLES > 0 else None
+    cycle = 0
+    while True:
+        cycle += 1
+        if profiler is not None:
+            profiler.enable()
+        with span('cycle', cycle=cycle):
+            run_cycle()
+        if profiler is not None:
+            profiler.disable()
+            if cycle >= PROFILE_CYCLES:
+                save_profile(profiler)
+                profiler = None
+
+        # Оновлення кожні 60 секунд
+        time.sleep(60)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Непередбачена помилка: {str(e)}")
+        print(f"Непередбачена помилка: {str(e)}")
@@ -0,0 +1,1492 @@
+import json
+import csv
+import time
+import logging
+import os
+import queue
+import re
+import sys
+import argparse
+import threading
+import functools
+import importlib.util
+from collections import Counter, defaultdict, deque, namedtuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from decimal import Decimal
+
+# Функція для лінивого імпорту: модуль завантажується при першому зверненні до його атрибутів
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# requests імпортується лише тоді, коли команді справді потрібна мережа
+requests = lazy_import('requests')
+
+# Налаштування логування
+def setup_logging():
+    logging.basicConfig(filename='log.txt', level=logging.DEBUG, 
+                        format='%(asctime)s %(levelname)s: %(message)s')
+
+# Дані з файлів завантажуються командами лише за потреби
+config = {}
+api_keys = {}
+api_keys_path = 'api_keys.json'
+wallet_addresses = []
+# Мережі, які приймає гаманець (друга колонка wallets.csv, через ";"): адреса -> список мереж
+wallet_chains = {}
+
+# Читання конфігураційного файлу
+def load_config(path='config.json'):
+    global config
+    try:
+        with open(path, 'r') as file:
+            config = json.load(file)
+    except Exception as e:
+        logging.error(f"Помилка при читанні {path}: {str(e)}")
+        raise
+
+# Читання API ключів
+def load_api_keys(path='api_keys.json'):
+    global api_keys, api_keys_path
+    try:
+        with open(path, 'r') as file:
+            api_keys = json.load(file)
+        api_keys_path = path
+    except Exception as e:
+        logging.error(f"Помилка при читанні {path}: {str(e)}")
+        raise
+
+# Читання адрес із файлу CSV
+def load_wallets(path='wallets.csv'):
+    global wallet_addresses, wallet_chains
+    try:
+        with open(path, 'r') as file:
+            reader = csv.reader(file)
+            wallet_addresses = []
+            wallet_chains = {}
+            for row in reader:
+                wallet_addresses.append(row[0])
+                if len(row) > 1 and row[1].strip():
+                    wallet_chains[row[0]] = [chain.strip() for chain in row[1].split(';') if chain.strip()]
+    except Exception as e:
+        logging.error(f"Помилка при читанні {path}: {str(e)}")
+        raise
+
+# Налаштування трасування і профілювання (секція "trace" у config.json):
+#   "enabled": true           - записувати тривалість викликів у файл трасування
+#   "file": "trace.json"      - файл у форматі Chrome Trace (chrome://tracing, ui.perfetto.dev)
+#   "profile_cycles": 3       - профілювати перші N циклів main()
+#   "profile_mode": "cprofile" або "sampling"
+#   "profile_file": "profile.prof" - результат cProfile (для sampling - згорнуті стеки)
+TRACE_ENABLED = False
+TRACE_FILE = 'trace.json'
+PROFILE_CYCLES = 0
+PROFILE_MODE = 'cprofile'
+PROFILE_FILE = 'profile.prof'
+SAMPLING_INTERVAL = 0.005
+
+# Функції, позначені @traced: назва функції -> (назва span, аргументи для запису)
+TRACED_FUNCTIONS = {}
+
+# Функція для застосування секції "trace" з config.json
+def setup_tracing():
+    global TRACE_ENABLED, TRACE_FILE, PROFILE_CYCLES, PROFILE_MODE, PROFILE_FILE, SAMPLING_INTERVAL
+    trace_config = config.get('trace', {})
+    TRACE_ENABLED = bool(trace_config.get('enabled', False))
+    TRACE_FILE = trace_config.get('file', 'trace.json')
+    PROFILE_CYCLES = int(trace_config.get('profile_cycles', 0))
+    PROFILE_MODE = trace_config.get('profile_mode', 'cprofile')
+    PROFILE_FILE = trace_config.get('profile_file', 'profile.prof' if PROFILE_MODE == 'cprofile' else 'profile.folded')
+    SAMPLING_INTERVAL = float(trace_config.get('sampling_interval', 0.005))
+    if TRACE_ENABLED:
+        # Обгортки встановлюються лише при увімкненому трасуванні
+        module_globals = globals()
+        for func_name, (name, arg_names) in TRACED_FUNCTIONS.items():
+            module_globals[func_name] = trace_wrapper(module_globals[func_name], name, arg_names)
+
+trace_lock = threading.Lock()
+trace_file = None
+
+# Функція для запису однієї події у файл трасування
+def write_trace_event(name, start_ns, end_ns, args=None):
+    global trace_file
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': start_ns / 1000,
+        'dur': (end_ns - start_ns) / 1000,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+    }
+    if args:
+        event['args'] = args
+    with trace_lock:
+        if trace_file is None:
+            # Формат JSON Array: закриваюча дужка необов'язкова, тому події дописуються по одній
+            trace_file = open(TRACE_FILE, 'w', encoding='utf-8')
+            trace_file.write('[\n')
+        trace_file.write(json.dumps(event, ensure_ascii=False) + ',\n')
+        trace_file.flush()
+
+# Функція для запису значень лічильників (наприклад, глибини черг) у файл трасування
+def write_trace_counter(name, values):
+    global trace_file
+    event = {
+        'name': name,
+        'ph': 'C',
+        'ts': time.perf_counter_ns() / 1000,
+        'pid': os.getpid(),
+        'args': values,
+    }
+    with trace_lock:
+        if trace_file is None:
+            trace_file = open(TRACE_FILE, 'w', encoding='utf-8')
+            trace_file.write('[\n')
+        trace_file.write(json.dumps(event, ensure_ascii=False) + ',\n')
+        trace_file.flush()
+
+# Контекстний менеджер для вимірювання тривалості ділянки коду
+@contextmanager
+def trace_span(name, **args):
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        write_trace_event(name, start_ns, time.perf_counter_ns(), args)
+
+# Функція, що повертає span або порожній контекст, якщо трасування вимкнено
+def span(name, **args):
+    if TRACE_ENABLED:
+        return trace_span(name, **args)
+    return nullcontext()
+
+# Функція для створення обгортки, що записує span навколо виклику функції
+def trace_wrapper(func, name, arg_names):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Записуються лише явно вказані аргументи, щоб у трасування не потрапили ключі
+        span_args = {arg_name: str(value) for arg_name, value in zip(arg_names, args)}
+        with trace_span(name, **span_args):
+            return func(*args, **kwargs)
+    return wrapper
+
+# Декоратор для трасування функцій; функція повертається без змін і обгортається
+# у setup_tracing() лише якщо трасування увімкнено
+def traced(name, arg_names=()):
+    def decorator(func):
+        TRACED_FUNCTIONS[func.__name__] = (name, arg_names)
+        return func
+    return decorator
+
+# Налаштування запису/відтворення HTTP-запитів (секція "cassette" у config.json):
+#   "mode": "record" або "replay"
+#   "file": "cassette.jsonl"  - файл касети, один запит/відповідь на рядок
+#   "speed": 1.0              - швидкість відтворення (2.0 - удвічі швидше, 0 - без затримок)
+#   "cycles": 5               - зупинитися після N циклів (0 - без обмеження)
+#   "script": "w1.8_show_wallets.py" - запустити іншу версію скрипта з цією касетою
+CASSETTE_MODE = None
+CASSETTE_FILE = 'cassette.jsonl'
+CASSETTE_SPEED = 1.0
+CASSETTE_CYCLES = 0
+
+# Заголовки, параметри і поля тіла запиту, що не потрапляють у касету
+SECRET_HEADERS = {'OK-ACCESS-KEY', 'OK-ACCESS-SIGN', 'OK-ACCESS-PASSPHRASE'}
+SECRET_FIELDS = {'pwd', 'apikey', 'api_key', 'secret_key', 'passphrase'}
+SECRET_QUERY = re.compile(r'((?:' + '|'.join(SECRET_FIELDS) + r')=)[^&]*', re.IGNORECASE)
+REDACTED = '***'
+
+cassette_lock = threading.Lock()
+cassette_entries = defaultdict(deque)
+cassette_start = time.monotonic()
+cycle_start = time.monotonic()
+cycle_count = 0
+recorded_cycles = 0
+original_request = None
+original_sleep = time.sleep
+
+# Функція для приховування секретів у URL, заголовках і тілі запиту
+def redact_url(url):
+    return SECRET_QUERY.sub(lambda match: match.group(1) + REDACTED, url)
+
+def redact_headers(headers):
+    return {name: REDACTED if name in SECRET_HEADERS else value for name, value in (headers or {}).items()}
+
+def redact_body(body):
+    if isinstance(body, dict):
+        return {name: REDACTED if name in SECRET_FIELDS else value for name, value in body.items()}
+    return body
+
+# Функція для запису запиту і відповіді у касету; помилка запиту (тайм-аут, обрив з'єднання)
+# записується замість відповіді і повторно піднімається
+def record_request(session, method, url, **kwargs):
+    offset = time.monotonic() - cassette_start
+    start = time.perf_counter()
+    entry = {
+        't': round(offset, 6),
+        'method': method.upper(),
+        'url': redact_url(url),
+        'request_headers': redact_headers(kwargs.get('headers')),
+        'request_body': redact_body(kwargs.get('json', kwargs.get('data'))),
+    }
+    try:
+        response = original_request(session, method, url, **kwargs)
+    except Exception as e:
+        entry['elapsed'] = round(time.perf_counter() - start, 6)
+        entry['error'] = {'type': type(e).__name__, 'module': type(e).__module__, 'message': str(e)}
+        write_cassette_entry(entry)
+        raise
+    entry['elapsed'] = round(time.perf_counter() - start, 6)
+    entry.update({
+        'status': response.status_code,
+        'reason': response.reason,
+        'headers': dict(response.headers),
+        'body': response.text,
+    })
+    write_cassette_entry(entry)
+    return response
+
+# Функція для відновлення записаної помилки запиту; невідомий тип стає ConnectionError
+def replay_error(error):
+    import builtins
+    if error['module'].startswith('requests'):
+        cls = getattr(requests.exceptions, error['type'], None)
+    else:
+        cls = getattr(builtins, error['type'], None)
+    if not (isinstance(cls, type) and issubclass(cls, Exception)):
+        cls = requests.exceptions.ConnectionError
+    return cls(error['message'])
+
+# Функція для дописування одного запису в касету
+def write_cassette_entry(entry):
+    with cassette_lock:
+        with open(CASSETTE_FILE, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+# Функція для завантаження касети; записи групуються за методом і URL у порядку запису
+def load_cassette():
+    global recorded_cycles
+    with open(CASSETTE_FILE, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                if 'cycle' in entry:
+                    recorded_cycles = entry['cycle']
+                else:
+                    cassette_entries[(entry['method'], entry['url'])].append(entry)
+    logging.info(f"Касету {CASSETTE_FILE} завантажено: {sum(len(entries) for entries in cassette_entries.values())} записів")
+
+# Функція для відтворення відповіді з касети замість реального запиту
+def replay_request(session, method, url, **kwargs):
+    key = (method.upper(), redact_url(url))
+    with cassette_lock:
+        entry = cassette_entries[key].popleft() if cassette_entries[key] else None
+    if entry is None:
+        raise requests.exceptions.ConnectionError(f"Запит {key[0]} {key[1]} відсутній у касеті {CASSETTE_FILE}")
+    if CASSETTE_SPEED > 0:
+        original_sleep(entry['elapsed'] / CASSETTE_SPEED)
+    if 'error' in entry:
+        raise replay_error(entry['error'])
+
+    response = requests.models.Response()
+    response.status_code = entry['status']
+    response.reason = entry['reason']
+    response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+# Заміна time.sleep: межа циклу, вимірювання його тривалості і прискорене очікування
+def cassette_sleep(seconds):
+    global cycle_start, cycle_count
+    # Межею циклу вважається лише очікування в основному потоці
+    if threading.current_thread() is not threading.main_thread():
+        return original_sleep(seconds)
+    cycle_count += 1
+    duration = time.monotonic() - cycle_start
+    logging.info(f"Касета: цикл {cycle_count} тривав {duration:.3f} с")
+    print(f"Касета: цикл {cycle_count} тривав {duration:.3f} с")
+    if CASSETTE_MODE == 'record':
+        write_cassette_entry({'cycle': cycle_count, 't': round(time.monotonic() - cassette_start, 6), 'duration': round(duration, 6)})
+    # Відтворення закінчується разом із записаними циклами або записами касети
+    replay_finished = CASSETTE_MODE == 'replay' and (cycle_count >= recorded_cycles or not any(cassette_entries.values()))
+    if (CASSETTE_CYCLES and cycle_count >= CASSETTE_CYCLES) or replay_finished:
+        raise SystemExit(0)
+    if CASSETTE_MODE == 'replay':
+        seconds = seconds / CASSETTE_SPEED if CASSETTE_SPEED > 0 else 0
+    original_sleep(seconds)
+    cycle_start = time.monotonic()
+
+# Функція для підключення касети до requests; працює і для старих версій скрипта
+def install_cassette():
+    global CASSETTE_MODE, CASSETTE_FILE, CASSETTE_SPEED, CASSETTE_CYCLES, original_request
+    cassette_config = config.get('cassette', {})
+    CASSETTE_MODE = cassette_config.get('mode')
+    CASSETTE_FILE = cassette_config.get('file', 'cassette.jsonl')
+    CASSETTE_SPEED = float(cassette_config.get('speed', 1.0))
+    CASSETTE_CYCLES = int(cassette_config.get('cycles', 0))
+    if CASSETTE_MODE not in ('record', 'replay'):
+        return
+    original_request = requests.Session.request
+    if CASSETTE_MODE == 'record':
+        requests.Session.request = record_request
+    elif CASSETTE_MODE == 'replay':
+        load_cassette()
+        requests.Session.request = replay_request
+    time.sleep = cassette_sleep
+    logging.info(f"Касета {CASSETTE_FILE} у режимі {CASSETTE_MODE}")
+
+# Функція для запуску іншої версії скрипта з підключеною касетою
+def run_cassette_script(path):
+    global cycle_start
+    import runpy
+    cycle_start = time.monotonic()
+    runpy.run_path(path, run_name='__main__')
+
+# Функція для створення підпису
+@traced('generate_signature')
+def generate_signature(timestamp, method, request_path, body, secret_key):
+    import hmac
+    import hashlib
+    import base64
+    body_str = json.dumps(body) if body else ''
+    message = timestamp + method + request_path + body_str
+    mac = hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256)
+    return base64.b64encode(mac.digest()).decode('utf-8')
+
+# Функція для виконання підписаного запиту до API OKX
+def okx_request(method, url, params=None, body=''):
+    from urllib.parse import urlencode
+    base_url = 'https://www.okx.com'
+    if params:
+        url = url + '?' + urlencode(params)
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"],
+        'Content-Type': 'application/json'
+    }
+    if method == 'GET':
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+    else:
+        response = requests.post(base_url + url, headers=headers, json=body, timeout=request_timeout())
+    response.raise_for_status()
+    data = response.json()
+    # OKX повертає помилки бізнес-логіки з HTTP 200 і ненульовим code
+    if data.get('code', '0') != '0':
+        raise requests.exceptions.RequestException(f"OKX {data.get('code')}: {data.get('msg')}", response=response)
+    return data
+
+# Функція для перевірки балансу
+@traced('check_balance')
+def check_balance():
+    url = '/api/v5/account/balance'
+    base_url = 'https://www.okx.com'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'GET'
+    body = ''
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"]
+    }
+    try:
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+        response.raise_for_status()
+        balance_data = response.json()
+        return balance_data
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при перевірці балансу: {str(e)}")
+        return None
+
+# Функція для фільтрації та виведення основної інформації про баланс
+def filter_balance_data(balance_data):
+    filtered_data = []
+    for detail in balance_data['data'][0]['details']:
+        if float(detail['eqUsd']) > 1:
+            filtered_data.append({
+                'Currency': detail['ccy'],
+                'Available Balance': round(float(detail['availBal']), 2),
+                'Equivalent in USD': round(float(detail['eqUsd']), 2)
+            })
+    return filtered_data
+
+# Функція для перевірки комісії
+@traced('check_fee', arg_names=('currency', 'chain'))
+def check_fee(currency, chain):
+    url = f'/api/v5/asset/currencies/{currency}'
+    base_url = 'https://www.okx.com'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'GET'
+    body = ''
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"]
+    }
+    try:
+        response = requests.get(base_url + url, headers=headers, timeout=request_timeout())
+        response.raise_for_status()
+        fee_data = response.json()
+        for item in fee_data['data']:
+            if item['ccy'] == currency and item['chain'] == chain:
+                # Без округлення: комісії на кшталт 0.0001 не повинні перетворюватися на 0
+                return float(get_chain_fee(item))
+        logging.error(f"Валюта {currency} у мережі {chain} не знайдена в отриманих даних.")
+        return None
+    except requests.exceptions.RequestException as e:
+        if e.response.status_code == 404:
+            logging.error(f"Помилка при перевірці комісії: Валюта не знайдена (404)")
+        else:
+            logging.error(f"Помилка при перевірці комісії: {str(e)}")
+        return None
+
+# Функція для отримання комісії мережі із запису /api/v5/asset/currencies
+def get_chain_fee(item):
+    return item['minFee'] if 'minFee' in item else item['withdrawal_min_fee']
+
+# Функція для підготовки і підпису запиту на виведення; мережа і комісія за замовчуванням беруться з config.json
+@traced('sign_withdrawal')
+def sign_withdrawal(job):
+    url = '/api/v5/asset/withdrawal'
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    method = 'POST'
+    body = {
+        'currency': config["currency"],
+        'amount': job['amount'],
+        'destination': '4',  # 4 - адреса гаманця
+        'toAddress': job['address'],
+        'chain': job.get('chain') or config["chain"],
+        'fee': str(job['fee']) if job.get('fee') is not None else config["max_fee"],
+        'pwd': api_keys["withdrawal_password"]
+    }
+
+    signature = generate_signature(timestamp, method, url, body, api_keys['secret_key'])
+    headers = {
+        'OK-ACCESS-KEY': api_keys["api_key"],
+        'OK-ACCESS-SIGN': signature,
+        'OK-ACCESS-TIMESTAMP': timestamp,
+        'OK-ACCESS-PASSPHRASE': api_keys["passphrase"],
+        'Content-Type': 'application/json'
+    }
+    job['request'] = (url, headers, body)
+    job['signed_at'] = time.monotonic()
+    return job
+
+# Функція для відправлення підписаного запиту на виведення; повертає текст помилки або None
+@traced('withdraw', arg_names=('address',))
+def submit_withdrawal(address, request):
+    url, headers, body = request
+    base_url = 'https://www.okx.com'
+    try:
+        response = requests.post(base_url + url, headers=headers, json=body, timeout=request_timeout())
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return str(e)
+    # OKX повертає помилки бізнес-логіки з HTTP 200 і ненульовим code
+    if data.get('code', '0') != '0':
+        return f"OKX {data.get('code')}: {data.get('msg')}"
+    return None
+
+# Функція для запису результату виведення в лог і на екран
+def report_withdrawal(job, error):
+    if error is None:
+        logging.info(f"Успішне виведення {job['amount']} {config['currency']} на адресу {job['address']}")
+        print(f"Успішне виведення {job['amount']} {config['currency']} на адресу {job['address']}")
+    else:
+        logging.error(f"Помилка при виведенні: {error}")
+        print(f"Помилка при виведенні: {error}")
+
+# Функція для отримання поточного значення GWEI через API Etherscan
+@traced('get_current_gwei')
+def get_current_gwei():
+    url = f'https://api.etherscan.io/api?module=gastracker&action=gasoracle&apikey={api_keys["etherscan_api_key"]}'
+    try:
+        response = requests.get(url, timeout=request_timeout())
+        response.raise_for_status()
+        data = response.json()
+        if data['status'] == '1':
+            return round(float(data['result']['ProposeGasPrice']), 2)
+        else:
+            logging.error(f"Помилка при запиті до Etherscan: {data['message']}")
+            return None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при запиті до Etherscan: {str(e)}")
+        return None
+
+# Спільний кеш GWEI і балансу для кількох запущених екземплярів скрипта (секція "shared_cache" у config.json):
+#   "enabled": true
+#   "port": 47390             - локальний порт; процес, що зайняв порт, стає лідером
+#   "gwei_ttl": 15            - максимальний вік значення GWEI, секунди
+#   "balance_ttl": 10         - максимальний вік балансу, секунди
+#   "fill_timeout": 10        - скільки чекати на значення, яке оновлює інший процес
+# Лідер зберігає значення з часом отримання і сам оновлює ключі, для яких має функцію запиту;
+# інші ключі оновлює один із процесів-читачів. Якщо лідер зупиняється, порт звільняється
+# і лідером стає перший процес, що не зміг до нього підключитися.
+# Кожен запит містить спільний токен (shared_cache.token поруч з api_keys.json): без нього
+# інший локальний процес не може ні прочитати баланс, ні записати підроблене значення.
+class SharedCache:
+    def __init__(self, port, token, fill_timeout=10.0):
+        self.port = port
+        self.token = token
+        self.fill_timeout = fill_timeout
+        self.store = {}
+        self.fills = {}
+        self.fetchers = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def register_fetcher(self, key, fetcher):
+        self.fetchers[key] = fetcher
+
+    def become_leader(self):
+        import socketserver
+        cache = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline())
+                response = cache.handle(request)
+                self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            # На Windows SO_REUSEADDR дозволяє зайняти вже зайнятий порт, тому лише для інших систем
+            allow_reuse_address = os.name != 'nt'
+
+        try:
+            self.server = Server(('127.0.0.1', self.port), Handler)
+        except OSError:
+            return False
+        threading.Thread(target=self.server.serve_forever, name='shared-cache', daemon=True).start()
+        logging.info(f"Спільний кеш: цей процес ({os.getpid()}) став лідером на порту {self.port}")
+        return True
+
+    def handle(self, request):
+        import hmac
+        if not hmac.compare_digest(str(request.get('token', '')), self.token):
+            return {'error': 'unauthorized'}
+        if request['op'] == 'get':
+            return self.handle_get(request['key'], request['max_age'])
+        self.handle_put(request['key'], request.get('value'))
+        return {'ok': True}
+
+    def handle_get(self, key, max_age):
+        now = time.time()
+        with self.lock:
+            entry = self.store.get(key)
+            if entry and now - entry[0] <= max_age:
+                return {'value': entry[1], 'ts': entry[0]}
+            # Оновлювати ключ дозволено лише одному процесу одночасно
+            lease = self.fills.get(key)
+            if lease and lease > now:
+                return {'wait': True}
+            self.fills[key] = now + self.fill_timeout
+            fetcher = self.fetchers.get(key)
+        if fetcher is None:
+            return {'fill': True}
+        value = fetcher()
+        self.handle_put(key, value)
+        if value is None:
+            return {'fill': True}
+        return {'value': value, 'ts': time.time()}
+
+    def handle_put(self, key, value):
+        with self.lock:
+            self.fills.pop(key, None)
+            if value is None:
+                self.store.pop(key, None)
+            else:
+                self.store[key] = (time.time(), value)
+
+    def request(self, request, timeout):
+        import socket
+        with socket.create_connection(('127.0.0.1', self.port), timeout=timeout) as connection:
+            connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+            with connection.makefile('r', encoding='utf-8') as reader:
+                return json.loads(reader.readline())
+
+    # Запит до лідера до настання deadline; None, якщо лідер так і не відповів
+    def call(self, request, deadline):
+        request = dict(request, token=self.token)
+        while True:
+            if self.server is not None:
+                return self.handle(request)
+            try:
+                return self.request(request, max(min(2.0, deadline - time.monotonic()), 0.01))
+            except (OSError, ValueError):
+                # Лідер недоступний або обірвав відповідь - пробуємо зайняти його місце.
+                # Якщо лідер живий, але не відповідає, порт зайнятий і чекаємо лише до deadline
+                if not self.become_leader():
+                    if time.monotonic() >= deadline:
+                        return None
+                    time.sleep(0.05)
+
+    def get(self, key, max_age, fetch):
+        deadline = time.monotonic() + self.fill_timeout
+        while time.monotonic() < deadline:
+            response = self.call({'op': 'get', 'key': key, 'max_age': max_age}, deadline)
+            if response is None:
+                break
+            if 'error' in response:
+                logging.error(f"Спільний кеш: лідер відхилив запит ({response['error']})")
+                break
+            if 'value' in response:
+                logging.debug(f"Спільний кеш: {key}, вік {time.time() - response['ts']:.1f} с")
+                return response['value']
+            if response.get('fill'):
+                value = fetch()
+                self.put(key, value)
+                return value
+            time.sleep(0.05)
+        logging.warning(f"Спільний кеш: не дочекалися значення {key}, запит напряму")
+        return fetch()
+
+    # Запис у кеш не обов'язковий, тому на нього відводиться не більше 2 секунд
+    def put(self, key, value):
+        self.call({'op': 'put', 'key': key, 'value': value}, time.monotonic() + min(self.fill_timeout, 2.0))
+
+    def invalidate(self, key):
+        self.put(key, None)
+
+shared_cache = None
+
+# Функція для ключа балансу: акаунт визначається хешем API ключа, а не самим ключем
+def balance_cache_key():
+    import hashlib
+    return 'funding:' + hashlib.sha256(api_keys["api_key"].encode('utf-8')).hexdigest()[:16]
+
+# Функція для читання токена спільного кешу; перший процес створює файл атомарно (os.link
+# не перезаписує наявний файл), тому всі екземпляри з тими самими ключами отримують один токен
+def load_cache_token():
+    import secrets
+    path = os.path.join(os.path.dirname(os.path.abspath(api_keys_path)), 'shared_cache.token')
+    if not os.path.exists(path):
+        temp_path = f"{path}.{os.getpid()}"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(secrets.token_hex(16))
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path, 'r') as file:
+        return file.read().strip()
+
+# Функція для підключення до спільного кешу (або запуску лідера)
+def setup_shared_cache():
+    global shared_cache
+    cache_config = config.get('shared_cache', {})
+    if not cache_config.get('enabled', False) or not api_keys:
+        return
+    shared_cache = SharedCache(int(cache_config.get('port', 47390)), load_cache_token(), float(cache_config.get('fill_timeout', 10)))
+    shared_cache.register_fetcher('gwei', get_current_gwei)
+    shared_cache.register_fetcher(balance_cache_key(), check_funding_balance)
+
+# Функція для отримання GWEI через спільний кеш
+def get_cached_gwei():
+    if shared_cache is None:
+        return get_current_gwei()
+    return shared_cache.get('gwei', float(config['shared_cache'].get('gwei_ttl', 15)), get_current_gwei)
+
+# Функція для отримання балансу funding-рахунку через спільний кеш
+def get_cached_balance():
+    if shared_cache is None:
+        return check_funding_balance()
+    return shared_cache.get(balance_cache_key(), float(config['shared_cache'].get('balance_ttl', 10)), check_funding_balance)
+
+# Функція для скидання балансу в кеші після зміни коштів на акаунті
+def invalidate_cached_balance():
+    if shared_cache is not None:
+        shared_cache.invalidate(balance_cache_key())
+
+# Результат перевірки одного шлюзу (gate) перед виведенням
+GateResult = namedtuple('GateResult', ['name', 'passed', 'reason', 'value', 'duration'])
+
+# Зареєстровані шлюзи: назва -> функція(context), що повертає (passed, reason, value)
+GATES = {}
+
+# Декоратор для реєстрації шлюзу; так само додаються і власні шлюзи користувача
+def register_gate(name):
+    def decorator(func):
+        GATES[name] = func
+        return func
+    return decorator
+
+# Шлюз: поточне значення GWEI менше max_gwei
+@register_gate('gwei')
+def gate_gwei(context):
+    gwei = get_cached_gwei()
+    if gwei is not None:
+        config_max_gwei = config.get('max_gwei', 5)  # Використовується 5 як значення за замовчуванням, якщо max_gwei відсутній
+
+        if gwei < config_max_gwei:
+            logging.info(f"Поточне значення GWEI ({gwei}) менше {config_max_gwei}, виконання зняття коштів дозволено.")
+            return True, f"GWEI {gwei} < {config_max_gwei}", gwei
+        else:
+            logging.warning(f"Поточне значення GWEI ({gwei}) більше {config_max_gwei}, виведення коштів заборонено.")
+            return False, f"GWEI {gwei} >= {config_max_gwei}", gwei
+    else:
+        logging.error("Не вдалося отримати поточне значення GWEI")
+    return False, "Не вдалося отримати поточне значення GWEI", None
+
+# Шлюз: на funding-рахунку достатньо коштів для всієї партії виведень
+@register_gate('balance')
+def gate_balance(context):
+    balance = get_cached_balance()
+    if not balance:
+        return False, "Не вдалося отримати баланс", None
+    currency = context['currency']
+    required = get_required_amount(context)
+    available = get_available_balance(balance, currency)
+    if available >= required:
+        return True, f"Баланс {available} {currency} >= {required}", balance
+    return False, f"Недостатньо коштів на балансі: {available} {currency} < {required}", balance
+
+# Шлюз: комісія мережі не перевищує max_fee
+@register_gate('fee')
+def gate_fee(context):
+    fee = check_fee(context['currency'], context['chain'])
+    if fee is None:
+        return False, "Не вдалося отримати дані про комісію", None
+    max_fee = float(config["max_fee"])
+    if fee <= max_fee:
+        return True, f"Комісія {fee} <= {max_fee}", fee
+    return False, f"Комісія {fee} перевищує max_fee {max_fee}", fee
+
+# Функція для перевірки балансу funding-рахунку: з нього виконуються виведення
+# і на нього надходять перекази з субакаунтів
+@traced('check_funding_balance')
+def check_funding_balance():
+    try:
+        return okx_request('GET', '/api/v5/asset/balances')
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при перевірці балансу: {str(e)}")
+        return None
+
+# Функція для отримання доступного балансу валюти з відповіді check_funding_balance
+def get_available_balance(balance, currency):
+    return sum((Decimal(item['availBal']) for item in balance['data'] if item['ccy'] == currency), Decimal('0'))
+
+# Функція для розрахунку суми, потрібної для всієї партії виведень, разом з комісією за кожне виведення:
+# запит без маршруту передає fee = max_fee, а мережі маршрутів мають комісію не більшу за max_fee
+def get_required_amount(context):
+    fee = Decimal(str(config["max_fee"]))
+    return (Decimal(str(context['amount'])) + fee) * len(context['selected_addresses'])
+
+# Дедлайн HTTP-запитів поточного потоку: шлюзи, sweep і знімки бірж не лише перестають чекати
+# на результат, а й обмежують тайм-аут кожного запиту залишком свого дедлайну
+request_context = threading.local()
+
+# Функція для обчислення дедлайну, не пізнішого за дедлайн, успадкований поточним потоком
+def make_deadline(timeout):
+    deadline = time.monotonic() + timeout
+    inherited = getattr(request_context, 'deadline', None)
+    return deadline if inherited is None else min(deadline, inherited)
+
+# Функція для виконання func з дедлайном HTTP-запитів у поточному потоці
+def call_with_deadline(deadline, func, *args):
+    previous = getattr(request_context, 'deadline', None)
+    request_context.deadline = deadline
+    try:
+        return func(*args)
+    finally:
+        request_context.deadline = previous
+
+# Тайм-аут HTTP-запиту: залишок дедлайну потоку, але не більше request_timeout з config.json
+def request_timeout():
+    timeout = float(config.get('request_timeout', 30))
+    deadline = getattr(request_context, 'deadline', None)
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+    return max(timeout, 0.1)
+
+# Функція для виконання одного шлюзу з вимірюванням часу
+def run_gate(name, gate, context):
+    start = time.perf_counter()
+    try:
+        with span(f"gate:{name}"):
+            passed, reason, value = gate(context)
+    except Exception as e:
+        logging.error(f"Помилка у шлюзі {name}: {str(e)}")
+        passed, reason, value = False, f"Помилка: {str(e)}", None
+    return GateResult(name, passed, reason, value, time.perf_counter() - start)
+
+# Функція для одночасної перевірки всіх шлюзів зі спільним дедлайном (gate_timeout у config.json)
+def evaluate_gates(context, gates=None):
+    from concurrent.futures import ThreadPoolExecutor, wait
+    gates = GATES if gates is None else gates
+    timeout = float(config.get('gate_timeout', 10))
+    deadline = make_deadline(timeout)
+    executor = ThreadPoolExecutor(max_workers=len(gates), thread_name_prefix='gate')
+    futures = {executor.submit(call_with_deadline, deadline, run_gate, name, gate, context): name for name, gate in gates.items()}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    # Не чекаємо на шлюзи, що не встигли до дедлайну
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    for future, name in futures.items():
+        if future in done:
+            results[name] = future.result()
+        else:
+            logging.error(f"Шлюз {name} не завершився за {timeout} с")
+            results[name] = GateResult(name, False, f"Перевищено час очікування {timeout} с", None, timeout)
+    passed = all(result.passed for result in results.values())
+    return passed, results
+
+# Функція для отримання списку субакаунтів
+@traced('list_subaccounts')
+def list_subaccounts():
+    data = okx_request('GET', '/api/v5/users/subaccount/list')
+    return [item['subAcct'] for item in data['data']]
+
+# Функція для отримання доступного балансу валюти на funding-рахунку субакаунта
+@traced('get_subaccount_balance', arg_names=('sub_account', 'currency'))
+def get_subaccount_balance(sub_account, currency):
+    data = okx_request('GET', '/api/v5/asset/subaccount/balances', {'subAcct': sub_account, 'ccy': currency})
+    return sum((Decimal(item['availBal']) for item in data['data'] if item['ccy'] == currency), Decimal('0'))
+
+# Функція для внутрішнього переказу з субакаунта на основний funding-рахунок
+@traced('transfer_from_subaccount', arg_names=('sub_account', 'currency', 'amount'))
+def transfer_from_subaccount(sub_account, currency, amount):
+    body = {
+        'ccy': currency,
+        'amt': str(amount),
+        'from': '6',  # 6 - funding-рахунок
+        'to': '6',
+        'type': '2',  # 2 - з субакаунта на основний акаунт
+        'subAcct': sub_account
+    }
+    okx_request('POST', '/api/v5/asset/transfer', body=body)
+    logging.info(f"Переказ {amount} {currency} з субакаунта {sub_account} на основний акаунт")
+    print(f"Переказ {amount} {currency} з субакаунта {sub_account} на основний акаунт")
+
+# Функція для вибору мінімального набору переказів, що покриває нестачу
+def plan_transfers(sub_balances, shortfall):
+    transfers = []
+    # Найбільші баланси першими - так переказів потрібно найменше
+    for sub_account, available in sorted(sub_balances.items(), key=lambda item: item[1], reverse=True):
+        if shortfall <= 0:
+            break
+        if available <= 0:
+            continue
+        amount = min(available, shortfall)
+        transfers.append((sub_account, amount))
+        shortfall -= amount
+    if shortfall > 0:
+        return None
+    return transfers
+
+# Функція для поповнення основного акаунта з субакаунтів перед виведенням
+# (subaccount_sweep і sweep_timeout у config.json)
+def sweep_subaccounts(currency, shortfall):
+    from concurrent.futures import ThreadPoolExecutor, wait
+    timeout = float(config.get('sweep_timeout', 20))
+    deadline = make_deadline(timeout)
+    try:
+        sub_accounts = call_with_deadline(deadline, list_subaccounts)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при отриманні списку субакаунтів: {str(e)}")
+        return False
+    if not sub_accounts:
+        logging.warning("Субакаунти не знайдено")
+        return False
+
+    # Баланси всіх субакаунтів запитуються одночасно
+    executor = ThreadPoolExecutor(max_workers=min(len(sub_accounts), 16), thread_name_prefix='sweep')
+    futures = {executor.submit(call_with_deadline, deadline, get_subaccount_balance, sub_account, currency): sub_account for sub_account in sub_accounts}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    sub_balances = {}
+    for future, sub_account in futures.items():
+        if future not in done:
+            logging.error(f"Баланс субакаунта {sub_account} не отримано за {timeout} с")
+        elif future.exception() is not None:
+            logging.error(f"Помилка при перевірці балансу субакаунта {sub_account}: {str(future.exception())}")
+        else:
+            sub_balances[sub_account] = future.result()
+
+    transfers = plan_transfers(sub_balances, shortfall)
+    if transfers is None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        logging.warning(f"На субакаунтах недостатньо {currency} для покриття нестачі {shortfall}")
+        return False
+
+    futures = {executor.submit(call_with_deadline, deadline, transfer_from_subaccount, sub_account, currency, amount): sub_account for sub_account, amount in transfers}
+    done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+    executor.shutdown(wait=False, cancel_futures=True)
+    success = True
+    for future, sub_account in futures.items():
+        if future not in done:
+            logging.error(f"Переказ з субакаунта {sub_account} не завершився за {timeout} с")
+            success = False
+        elif future.exception() is not None:
+            logging.error(f"Помилка при переказі з субакаунта {sub_account}: {str(future.exception())}")
+            success = False
+    return success
+
+# Кеш метаданих валют: валюта -> (час отримання, {мережа: метадані})
+currency_metadata_cache = {}
+
+# Функція для розбору метаданих однієї мережі
+def parse_chain_metadata(item):
+    return {
+        'fee': Decimal(get_chain_fee(item)),
+        'enabled': item.get('canWd', True) in (True, 'true'),
+        'min_withdrawal': Decimal(item.get('minWd') or '0'),
+        'precision': item.get('wdTickSz'),
+    }
+
+# Функція для отримання метаданих усіх мереж валюти одним запитом (з кешем на metadata_ttl секунд)
+@traced('get_currency_chains', arg_names=('currency',))
+def get_currency_chains(currency):
+    ttl = float(config.get('metadata_ttl', 300))
+    cached = currency_metadata_cache.get(currency)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    try:
+        data = okx_request('GET', '/api/v5/asset/currencies', {'ccy': currency})
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Помилка при отриманні мереж {currency}: {str(e)}")
+        if cached:
+            logging.warning(f"Використовуються застарілі дані про мережі {currency}")
+            return cached[1]
+        return None
+    chains = {item['chain']: parse_chain_metadata(item) for item in data['data'] if item['ccy'] == currency}
+    currency_metadata_cache[currency] = (time.monotonic(), chains)
+    return chains
+
+# Шлюз режиму маршрутизації: поточне значення GWEI (перевіряється для кожної мережі окремо)
+def gate_gas_price(context):
+    gwei = get_cached_gwei()
+    if gwei is None:
+        # Як і шлюз gwei: без поточного значення виведення не дозволяється
+        logging.error("Не вдалося отримати поточне значення GWEI")
+        return False, "Не вдалося отримати поточне значення GWEI", None
+    return True, f"GWEI {gwei}", gwei
+
+# Шлюз режиму маршрутизації: є хоча б одна увімкнена мережа з комісією <= max_fee
+def gate_routes(context):
+    chains = get_currency_chains(context['currency'])
+    if chains is None:
+        return False, "Не вдалося отримати дані про мережі", None
+    max_fee = Decimal(str(config["max_fee"]))
+    available = [chain for chain, meta in chains.items() if meta['enabled'] and meta['fee'] <= max_fee]
+    if not available:
+        return False, f"Немає увімкнених мереж з комісією <= {max_fee}", chains
+    return True, f"Доступні мережі: {', '.join(available)}", chains
+
+# Шлюзи режиму маршрутизації: замість gwei і fee для однієї мережі
+def routing_gates():
+    gates = {name: gate for name, gate in GATES.items() if name not in ('gwei', 'fee')}
+    gates['gas_price'] = gate_gas_price
+    gates['routes'] = gate_routes
+    return gates
+
+# Функція для вибору найдешевшої мережі для кожного гаманця партії
+# (routing і chain_max_gwei у config.json; мережі без власного ліміту обмежує max_gwei)
+def plan_routes(addresses, chains, gwei):
+    max_fee = Decimal(str(config["max_fee"]))
+    amount = Decimal(str(config["amount"]))
+    chain_max_gwei = config.get('chain_max_gwei', {})
+    max_gwei = config.get('max_gwei', 5)
+
+    # Придатність кожної мережі визначається один раз для всієї партії
+    eligible = {}
+    for chain, meta in chains.items():
+        limit = chain_max_gwei.get(chain, max_gwei)
+        gas_ok = gwei is not None and gwei < limit
+        if meta['enabled'] and meta['fee'] <= max_fee and amount >= meta['min_withdrawal'] and gas_ok:
+            eligible[chain] = meta['fee']
+
+    routes = []
+    unrouted = []
+    best_by_accepted = {}
+    for address in addresses:
+        accepted = tuple(wallet_chains.get(address) or [config["chain"]])
+        if accepted not in best_by_accepted:
+            candidates = [chain for chain in accepted if chain in eligible]
+            best_by_accepted[accepted] = min(candidates, key=eligible.get) if candidates else None
+        chain = best_by_accepted[accepted]
+        if chain is None:
+            unrouted.append(address)
+        else:
+            routes.append((address, chain, eligible[chain]))
+    return routes, unrouted
+
+# Функція для виведення маршрутів на екран
+def print_routes(routes, unrouted):
+    for address, chain, fee in routes:
+        print(f"{address}: {chain}, комісія {fee}")
+    for address in unrouted:
+        logging.warning(f"Для адреси {address} немає доступної мережі")
+        print(f"{address}: немає доступної мережі")
+
+# Функція-планувальник: ліниво створює завдання на виведення для вибраних гаманців
+def plan_jobs(addresses, routes=None):
+    if routes is not None:
+        for address, chain, fee in routes:
+            yield {'amount': config["amount"], 'address': address, 'chain': chain, 'fee': fee}
+    else:
+        for address in addresses:
+            yield {'amount': config["amount"], 'address': address}
+
+# OKX приймає підпис, якщо його час відрізняється від часу сервера не більше ніж на 30 секунд
+SIGNATURE_MAX_AGE = 25
+
+# Маркер завершення роботи етапу конвеєра
+PIPELINE_DONE = object()
+
+# Конвеєр виведення: планувальник -> підпис -> пул відправників -> запис результатів.
+# Етапи з'єднані обмеженими чергами, тому повільний етап зупиняє попередні, а пам'ять не росте
+# разом із розміром партії (pipeline_workers, pipeline_queue_size, pipeline_monitor_interval у config.json)
+class WithdrawalPipeline:
+    def __init__(self, workers=1, queue_size=16, monitor_interval=5.0):
+        self.workers = workers
+        self.monitor_interval = monitor_interval
+        self.sign_queue = queue.Queue(maxsize=queue_size)
+        self.submit_queue = queue.Queue(maxsize=queue_size)
+        self.result_queue = queue.Queue(maxsize=queue_size)
+        self.max_depths = Counter()
+        self.succeeded = 0
+        self.failed = 0
+        self.stop_event = threading.Event()
+
+    def queue_depths(self):
+        return {
+            'sign': self.sign_queue.qsize(),
+            'submit': self.submit_queue.qsize(),
+            'result': self.result_queue.qsize(),
+        }
+
+    def signer(self):
+        while True:
+            job = self.sign_queue.get()
+            if job is PIPELINE_DONE:
+                for _ in range(self.workers):
+                    self.submit_queue.put(PIPELINE_DONE)
+                return
+            try:
+                self.submit_queue.put(sign_withdrawal(job))
+            except Exception as e:
+                self.result_queue.put((job, f"Помилка при підписі запиту: {str(e)}"))
+
+    def submitter(self):
+        try:
+            while True:
+                job = self.submit_queue.get()
+                if job is PIPELINE_DONE:
+                    return
+                try:
+                    # Підпис, що застарів у черзі, створюється заново
+                    if time.monotonic() - job['signed_at'] > SIGNATURE_MAX_AGE:
+                        job = sign_withdrawal(job)
+                    error = submit_withdrawal(job['address'], job['request'])
+                except Exception as e:
+                    error = f"Помилка при відправленні запиту: {str(e)}"
+                self.result_queue.put((job, error))
+        finally:
+            # sink чекає на маркер від кожного відправника, тому він надсилається за будь-якого виходу
+            self.result_queue.put(PIPELINE_DONE)
+
+    def sink(self):
+        finished_workers = 0
+        while finished_workers < self.workers:
+            item = self.result_queue.get()
+            if item is PIPELINE_DONE:
+                finished_workers += 1
+                continue
+            job, error = item
+            if error is None:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            try:
+                report_withdrawal(job, error)
+            except Exception as e:
+                # Запис результату не повинен зупиняти конвеєр
+                print(f"Помилка при записі результату виведення: {str(e)}")
+
+    def monitor(self):
+        while not self.stop_event.wait(self.monitor_interval):
+            depths = self.queue_depths()
+            logging.debug(f"Глибина черг конвеєра: {depths}")
+            if TRACE_ENABLED:
+                write_trace_counter('pipeline_queues', depths)
+
+    def run(self, jobs):
+        threads = [threading.Thread(target=self.signer, name='pipeline-signer', daemon=True)]
+        threads += [threading.Thread(target=self.submitter, name=f'pipeline-submitter-{i}', daemon=True) for i in range(self.workers)]
+        threads.append(threading.Thread(target=self.sink, name='pipeline-sink', daemon=True))
+        monitor = threading.Thread(target=self.monitor, name='pipeline-monitor', daemon=True)
+        for thread in threads:
+            thread.start()
+        monitor.start()
+
+        # Планувальник працює в поточному потоці: put() блокується, поки черга повна
+        for job in jobs:
+            self.sign_queue.put(job)
+            for name, depth in self.queue_depths().items():
+                self.max_depths[name] = max(self.max_depths[name], depth)
+        self.sign_queue.put(PIPELINE_DONE)
+
+        for thread in threads:
+            thread.join()
+        self.stop_event.set()
+        monitor.join()
+        logging.info(f"Конвеєр завершено: успішно {self.succeeded}, з помилками {self.failed}, максимальна глибина черг {dict(self.max_depths)}")
+        print(f"Виведень успішно: {self.succeeded}, з помилками: {self.failed}")
+        return self.succeeded, self.failed
+
+# Функція для виконання партії виведень через конвеєр
+def run_withdrawals(jobs):
+    pipeline = WithdrawalPipeline(
+        workers=int(config.get('pipeline_workers', 1)),
+        queue_size=int(config.get('pipeline_queue_size', 16)),
+        monitor_interval=float(config.get('pipeline_monitor_interval', 5)),
+    )
+    with span('pipeline'):
+        result = pipeline.run(jobs)
+    invalidate_cached_balance()
+    return result
+
+# Функція для друку параметрів конфігурації
+def print_config():
+    print(json.dumps(config, indent=4))
+
+# Функція для обробки діапазонів індексів гаманців
+def process_wallet_indexes(indexes):
+    expanded_indexes = []
+    for index in indexes:
+        if isinstance(index, str) and '-' in index:
+            start, end = map(int, index.split('-'))
+            expanded_indexes.extend(range(start, end + 1))
+        else:
+            expanded_indexes.append(int(index))
+    return expanded_indexes
+
+# Клас для вибіркового (sampling) профілювання всіх потоків: шлюзи і виведення працюють у робочих
+# потоках, тому кожен стек починається з назви потоку
+class SamplingProfiler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Запис у форматі згорнутих стеків (flamegraph.pl, speedscope)
+    def dump_stats(self, filename):
+        with open(filename, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+# Клас для профілювання cProfile усіх потоків: кожен потік, створений під час профілювання,
+# отримує власний cProfile.Profile (через threading.setprofile), а результати об'єднуються
+class ThreadProfiler:
+    def __init__(self):
+        import cProfile
+        self.main_profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+
+    # Перша подія в новому потоці: далі подіями цього потоку керує його власний профайлер
+    def start_thread(self, frame, event, arg):
+        import cProfile
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: профайлер основного потоку вже бачить усі потоки
+            return
+        with self.lock:
+            self.thread_profiles.append((threading.current_thread(), profile))
+
+    def enable(self):
+        threading.setprofile(self.start_thread)
+        self.main_profile.enable()
+
+    def disable(self):
+        self.main_profile.disable()
+        threading.setprofile(None)
+
+    def stats(self):
+        import pstats
+        stats = pstats.Stats(self.main_profile)
+        with self.lock:
+            # Потоки, що ще працюють (наприклад, шлюз після дедлайну), пропускаються
+            finished = [profile for thread, profile in self.thread_profiles if not thread.is_alive()]
+        for profile in finished:
+            stats.add(profile)
+        return stats
+
+    def dump_stats(self, filename):
+        self.stats().dump_stats(filename)
+
+# Функція для створення профайлера відповідно до profile_mode
+def create_profiler():
+    if PROFILE_MODE == 'sampling':
+        return SamplingProfiler(SAMPLING_INTERVAL)
+    return ThreadProfiler()
+
+# Функція для збереження результатів профілювання
+def save_profile(profiler):
+    profiler.dump_stats(PROFILE_FILE)
+    logging.info(f"Результати профілювання збережено у {PROFILE_FILE}")
+    print(f"Результати профілювання збережено у {PROFILE_FILE}")
+    if isinstance(profiler, ThreadProfiler):
+        profiler.stats().sort_stats('cumulative').print_stats(20)
+
+# Вивід адрес гаманців з файлу wallets.csv за порядковими номерами з config.json
+def select_wallets():
+    selected_addresses = []
+    if "wallet_indexes" in config:
+        print("Адреси гаманців вибрані з wallets.csv:")
+        processed_indexes = process_wallet_indexes(config["wallet_indexes"])
+        for index in processed_indexes:
+            if index <= len(wallet_addresses):
+                address = wallet_addresses[index - 1]
+                selected_addresses.append(address)
+                print(f"{index}: {address}")
+            else:
+                logging.error(f"Індекс {index} перевищує кількість адрес у файлі")
+    else:
+        print("Порядкові номери гаманців не знайдено в конфігурації")
+    return selected_addresses
+
+# Функція для виведення балансу на екран
+def print_balance(balance):
+    filtered_balance = filter_balance_data(balance)
+    for entry in filtered_balance:
+        print(f"Currency: {entry['Currency']}, Available Balance: {entry['Available Balance']}, Equivalent in USD: {entry['Equivalent in USD']}")
+    total_eq_usd = round(float(balance['data'][0]['totalEq']), 2)
+    print(f"Total Equivalent in USD: {total_eq_usd}")
+
+# Один цикл перевірок і виведення коштів
+def run_cycle():
+    print_config()
+    selected_addresses = select_wallets()
+
+    # Перевірка GWEI, балансу і комісії виконується одночасно
+    context = {
+        'currency': config["currency"],
+        'chain': config["chain"],
+        'amount': config["amount"],
+        'selected_addresses': selected_addresses,
+    }
+    routing = config.get('routing', False)
+    passed, results = evaluate_gates(context, routing_gates() if routing else None)
+
+    balance = results['balance'].value if 'balance' in results else None
+    if balance:
+        print(f"Доступно на funding-рахунку: {get_available_balance(balance, config['currency'])} {config['currency']}")
+    if 'fee' in results and results['fee'].value is not None:
+        print(f"Комісія на виведення {config['currency']} у мережі {config['chain']}: {results['fee'].value}")
+
+    for result in results.values():
+        status = "OK" if result.passed else "ВІДМОВА"
+        print(f"[{status}] {result.name}: {result.reason} ({result.duration:.3f} с)")
+
+    # Якщо не вистачає лише коштів на основному акаунті - поповнюємо його з субакаунтів
+    failed = [name for name, result in results.items() if not result.passed]
+    if failed == ['balance'] and balance and config.get('subaccount_sweep', False):
+        shortfall = get_required_amount(context) - get_available_balance(balance, context['currency'])
+        print(f"Нестача {shortfall} {context['currency']}, поповнення з субакаунтів")
+        with span('sweep', shortfall=str(shortfall)):
+            passed = sweep_subaccounts(context['currency'], shortfall)
+        invalidate_cached_balance()
+        if not passed:
+            print("Недостатньо коштів на балансі")
+
+    if passed and routing:
+        routes, unrouted = plan_routes(selected_addresses, results['routes'].value, results['gas_price'].value)
+        print_routes(routes, unrouted)
+        run_withdrawals(plan_jobs(selected_addresses, routes))
+    elif passed:
+        run_withdrawals(plan_jobs(selected_addresses))
+    else:
+        print("Виведення коштів заборонено: " + "; ".join(result.reason for result in results.values() if not result.passed))
+
+# Основна логіка
+def main():
+    profiler = create_profiler() if PROFILE_CYCLES > 0 else None
+    cycle = 0
+    while True:
+        cycle += 1
+        if profiler is not None:
+            profiler.enable()
+        with span('cycle', cycle=cycle):
+            run_cycle()
+        if profiler is not None:
+            profiler.disable()
+            if cycle >= PROFILE_CYCLES:
+                save_profile(profiler)
+                profiler = None
+
+        # Оновлення кожні 60 секунд
+        time.sleep(60)
+
+# Команда balance: баланс акаунта
+def command_balance(args):
+    balance = check_balance()
+    if not balance:
+        print("Не вдалося отримати баланс")
+        return 1
+    print_balance(balance)
+    return 0
+
+# Команда fee: комісія на виведення у мережі
+def command_fee(args):
+    currency = args.currency or config["currency"]
+    chain = args.chain or config["chain"]
+    fee = check_fee(currency, chain)
+    if fee is None:
+        print("Не вдалося отримати дані про комісію")
+        return 1
+    print(f"Комісія на виведення {currency} у мережі {chain}: {fee}")
+    return 0
+
+# Команда gas: поточне значення GWEI і рішення шлюзу
+def command_gas(args):
+    passed, reason, gwei = gate_gwei({})
+    print(reason)
+    return 0 if gwei is not None else 1
+
+# Команда plan: вибрані гаманці і сума партії без звернень до API
+def command_plan(args):
+    print_config()
+    selected_addresses = select_wallets()
+    total = Decimal(str(config["amount"])) * len(selected_addresses)
+    print(f"Виведень: {len(selected_addresses)}, загальна сума: {total} {config['currency']} у мережі {config['chain']}")
+    return 0
+
+# Команда routes: найдешевша доступна мережа для кожного вибраного гаманця
+def command_routes(args):
+    selected_addresses = select_wallets()
+    context = {'currency': config["currency"]}
+    passed, results = evaluate_gates(context, {'gas_price': gate_gas_price, 'routes': gate_routes})
+    if results['routes'].value is None:
+        print(results['routes'].reason)
+        return 1
+    routes, unrouted = plan_routes(selected_addresses, results['routes'].value, results['gas_price'].value)
+    print_routes(routes, unrouted)
+    return 0
+
+# Команда withdraw: один цикл перевірок і виведення
+def command_withdraw(args):
+    run_cycle()
+    return 0
+
+# Команда daemon: безперервна робота з оновленням кожні 60 секунд
+def command_daemon(args):
+    script = config.get('cassette', {}).get('script')
+    if script:
+        run_cassette_script(script)
+    else:
+        main()
+    return 0
+
+# Команди і ресурси, які їм потрібні
+COMMANDS = {
+    'balance': (command_balance, "Показати баланс акаунта", ('api_keys',)),
+    'fee': (command_fee, "Показати комісію на виведення", ('api_keys',)),
+    'gas': (command_gas, "Показати поточне значення GWEI", ('api_keys',)),
+    'plan': (command_plan, "Показати вибрані гаманці без звернень до API", ('wallets',)),
+    'routes': (command_routes, "Показати найдешевшу мережу для кожного гаманця", ('api_keys', 'wallets')),
+    'withdraw': (command_withdraw, "Виконати один цикл виведення", ('api_keys', 'wallets')),
+    'daemon': (command_daemon, "Працювати безперервно (за замовчуванням)", ('api_keys', 'wallets')),
+}
+
+# Функція для розбору аргументів командного рядка
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Виведення криптовалюти з біржі OKX")
+    parser.add_argument('--config', default='config.json', help="Шлях до config.json")
+    parser.add_argument('--api-keys', default='api_keys.json', help="Шлях до api_keys.json")
+    parser.add_argument('--wallets', default='wallets.csv', help="Шлях до wallets.csv")
+    subparsers = parser.add_subparsers(dest='command')
+    for name, (handler, help_text, resources) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if name == 'fee':
+            subparser.add_argument('--currency', help="Валюта (за замовчуванням з config.json)")
+            subparser.add_argument('--chain', help="Мережа (за замовчуванням з config.json)")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args.command = 'daemon'
+    return args
+
+# Точка входу: завантажує лише ті файли, які потрібні команді
+def cli(argv=None):
+    args = parse_args(argv)
+    handler, help_text, resources = COMMANDS[args.command]
+    setup_logging()
+    try:
+        load_config(args.config)
+        if 'api_keys' in resources:
+            load_api_keys(args.api_keys)
+        if 'wallets' in resources:
+            load_wallets(args.wallets)
+    except Exception as e:
+        print(f"Помилка при читанні файлів: {str(e)}")
+        return 1
+    setup_tracing()
+    install_cassette()
+    setup_shared_cache()
+    try:
+        return handler(args)
+    except Exception as e:
+        logging.error(f"Непередбачена помилка: {str(e)}")
+        print(f"Непередбачена помилка: {str(e)}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(cli())